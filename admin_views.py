@@ -1,17 +1,170 @@
 # admin_views.py - Enhanced with file upload support
 from flask_admin import AdminIndexView, expose
 from flask_admin.contrib.sqla import ModelView
-from flask_admin.form.upload import FileUploadField, ImageUploadField
+from flask_admin.model.form import InlineFormAdmin
+from flask_admin.form.upload import FileUploadField, ImageUploadField, thumbgen_filename
 from flask_login import current_user
-from flask import redirect, url_for, request
-from wtforms import validators
+from flask import current_app, redirect, url_for, request
+from markupsafe import Markup
+from sqlalchemy import event, func, case, inspect
+from sqlalchemy.orm import Session, object_session, selectinload
+from wtforms import validators, ValidationError
 import os
+import io
+import tempfile
+import uuid
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 import PIL.Image
+import PIL.ImageOps
 from wtforms import SelectField
+from models import cache, Project, ProjectImage
 
-# Monkey patch for Pillow 10.0.0 compatibility
-if not hasattr(PIL.Image, 'ANTIALIAS'):
-    PIL.Image.ANTIALIAS = PIL.Image.LANCZOS
+# libvips is optional - uploads fall back to Pillow resizing without it
+try:
+    import pyvips
+except (ImportError, OSError):
+    pyvips = None
+
+# Background workers for upload file work, so admin saves don't wait on it
+_file_executor = ThreadPoolExecutor(max_workers=2)
+
+
+def _remove_file(path):
+    """Delete a file, ignoring it if it is already gone"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+@contextmanager
+def _atomic_write(path):
+    """Yield a temporary sibling of path and move it into place once written"""
+    root, ext = os.path.splitext(path)
+    tmp_path = f'{root}.{uuid.uuid4().hex}.tmp{ext}'
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        _remove_file(tmp_path)
+        raise
+
+
+# ============================================================================
+# Upload Fields
+# ============================================================================
+class VipsImageUploadField(ImageUploadField):
+    """ImageUploadField that resizes with libvips shrink-on-load when available,
+    falling back to Pillow with JPEG draft mode"""
+
+    def _save_file(self, data, filename):
+        if not self.image:
+            return super()._save_file(data, filename)
+
+        filename, format = self._get_save_format(filename, self.image)
+        path = self._get_path(filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        thumb_path = self._get_path(self.thumbnail_fn(filename)) if self.thumbnail_size else None
+
+        # Serve a placeholder until the resized variants replace it; if resizing
+        # fails the placeholder stays, so the page never links a missing file
+        self._save_placeholder(path, self.max_size, format)
+        if thumb_path:
+            self._save_placeholder(thumb_path, self.thumbnail_size, format)
+
+        # Park the raw upload outside static/ so it is never served, and build
+        # the resized variants off the request thread
+        fd, pending_path = tempfile.mkstemp(prefix='upload-')
+        data.seek(0)
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(data.read())
+
+        args = (pending_path, path, thumb_path, format, current_app.logger)
+        try:
+            _file_executor.submit(self._save_variants, *args)
+        except RuntimeError:
+            # Executor is shutting down - resize synchronously instead
+            self._save_variants(*args)
+
+        return filename
+
+    def _save_placeholder(self, path, size, format):
+        """Write a plain grey image with the dimensions the variant will have"""
+        width, height = self.image.size
+        if size:
+            max_width, max_height, force = size
+            if force:
+                width, height = max_width, max_height
+            else:
+                scale = min(max_width / width, max_height / height, 1)
+                width, height = max(1, round(width * scale)), max(1, round(height * scale))
+        with _atomic_write(path) as tmp_path:
+            self._save_image(PIL.Image.new('RGB', (width, height), (218, 221, 225)), tmp_path, format)
+
+    def _save_variants(self, pending_path, path, thumb_path, format, logger):
+        """Write the max_size image and thumbnail from the parked upload"""
+        try:
+            with open(pending_path, 'rb') as fp:
+                buffer = fp.read()
+            if pyvips is not None:
+                try:
+                    self._save_vips_variants(buffer, path, thumb_path)
+                    return
+                except pyvips.Error:
+                    logger.exception('libvips failed to resize %s, retrying with Pillow', path)
+            self._save_pillow_variants(buffer, path, thumb_path, format)
+        except Exception:
+            logger.exception('Failed to resize upload %s, leaving the placeholder in place', path)
+        finally:
+            _remove_file(pending_path)
+
+    def _save_vips_variants(self, buffer, path, thumb_path):
+        # keep='none' strips EXIF/GPS like the Pillow path does
+        with _atomic_write(path) as tmp_path:
+            self._vips_thumbnail(buffer, self.max_size).write_to_file(tmp_path, keep='none')
+        if thumb_path:
+            with _atomic_write(thumb_path) as tmp_path:
+                self._vips_thumbnail(buffer, self.thumbnail_size).write_to_file(tmp_path, keep='none')
+
+    def _save_pillow_variants(self, buffer, path, thumb_path, format):
+        image = PIL.Image.open(io.BytesIO(buffer))
+        if self.max_size:
+            image = self._resize(image, self.max_size)
+        with _atomic_write(path) as tmp_path:
+            self._save_image(image, tmp_path, format)
+        if thumb_path:
+            with _atomic_write(thumb_path) as tmp_path:
+                self._save_image(self._resize(image, self.thumbnail_size), tmp_path, format)
+
+    def _resize(self, image, size):
+        (width, height, force) = size
+        if image.size[0] <= width and image.size[1] <= height:
+            return image
+        # Let the JPEG decoder downscale in the IDCT; a no-op once pixels are loaded
+        image.draft('RGB', (width * 2, height * 2))
+        # reduce() rejects palette and bilevel images
+        if image.mode in ('P', '1'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        # Do the heavy shrink with a box-filter reduce, leaving Lanczos the last 2x
+        factor = min(image.size[0] // (2 * width), image.size[1] // (2 * height))
+        if factor > 1:
+            image = image.reduce(factor)
+        if force:
+            return PIL.ImageOps.fit(image, (width, height), PIL.Image.LANCZOS)
+        # Resize in place - copy() would force a full-resolution decode
+        image.thumbnail((width, height), PIL.Image.LANCZOS)
+        return image
+
+    def _vips_thumbnail(self, buffer, size):
+        if not size:
+            return pyvips.Image.new_from_buffer(buffer, '')
+        width, height, force = size
+        # size='down' only shrinks; crop matches ImageOps.fit for forced sizes
+        return pyvips.Image.thumbnail_buffer(
+            buffer, width, height=height, size='down',
+            crop='centre' if force else 'none'
+        )
 
 
 # ============================================================================
@@ -24,6 +177,17 @@ class AuthenticatedModelView(ModelView):
     def inaccessible_callback(self, name, **kwargs):
         return redirect(url_for('admin_login', next=request.url))
 
+    # Skip the COUNT(*) Flask-Admin runs alongside each list page and use
+    # next/previous paging. Set to False per view if exact counts are needed
+    simple_list_pager = True
+
+    # Drop the cached homepage once admin changes are committed
+    def after_model_change(self, form, model, is_created):
+        cache.delete('home')
+
+    def after_model_delete(self, model):
+        cache.delete('home')
+
 class MyAdminIndexView(AdminIndexView):
     def is_accessible(self):
         return current_user.is_authenticated
@@ -33,13 +197,18 @@ class MyAdminIndexView(AdminIndexView):
     
     @expose('/')
     def index(self):
-        from models import Student, Project, Publication
+        from models import db, Student, Project, Publication
         
-        total_students = Student.query.count()
-        current_students = Student.query.filter_by(is_current=True).count()
-        total_projects = Project.query.count()
-        active_projects = Project.query.filter_by(status='Ongoing').count()
-        total_publications = Publication.query.count()
+        # One conditional-aggregate query per table instead of a COUNT per stat
+        total_students, current_students = db.session.query(
+            func.count(Student.id),
+            func.count(case((Student.is_current == True, 1)))
+        ).one()
+        total_projects, active_projects = db.session.query(
+            func.count(Project.id),
+            func.count(case((Project.status == 'Ongoing', 1)))
+        ).one()
+        total_publications = db.session.query(func.count(Publication.id)).scalar()
         
         return self.render('admin/index.html', 
                           current_user=current_user,
@@ -59,7 +228,7 @@ class ProfessorModelView(AuthenticatedModelView):
     
     # Configure file upload for photo field
     form_overrides = {
-        'photo': ImageUploadField
+        'photo': VipsImageUploadField
     }
     
     form_args = {
@@ -72,18 +241,8 @@ class ProfessorModelView(AuthenticatedModelView):
             'thumbnail_size': (100, 100, True)  # Thumbnail for admin view
         }
     }
-    
-    # Optional: Add custom validation
-    def on_model_change(self, form, model, is_created):
-        # Handle old photo deletion when updating
-        if not is_created and 'photo' in form:
-            old_photo = model.photo
-            if old_photo and old_photo != form.photo.data:
-                # Delete old photo file
-                old_path = os.path.join('static/uploads/professor', old_photo)
-                if os.path.exists(old_path):
-                    os.remove(old_path)
-        return super().on_model_change(form, model, is_created)
+
+    # Replaced photos and their thumbnails are deleted by ImageUploadField.populate_obj
 
 
 class StudentModelView(AuthenticatedModelView):
@@ -94,7 +253,7 @@ class StudentModelView(AuthenticatedModelView):
     
     # Configure file upload for photo field
     form_overrides = {
-        'photo': ImageUploadField,
+        'photo': VipsImageUploadField,
         'degree_type': SelectField  
     }
     
@@ -115,86 +274,88 @@ class StudentModelView(AuthenticatedModelView):
     }
     
     # Custom column formatter to show photo thumbnails in list view
+    _thumbnail_html = Markup('<img src="/static/uploads/students/%s" width="50">')
+
     def _list_thumbnail(view, context, model, name):
         if not model.photo:
             return ''
-        return f'<img src="/{view.form_args["photo"]["url_relative_path"]}{model.photo}" width="50">'
+        return view._thumbnail_html % model.photo
     
     column_formatters = {
         'photo': _list_thumbnail
     }
 
+def _image_required(form, field):
+    """Inline image rows need a file - remove the row to drop an image"""
+    if field._should_delete or not (field._is_uploaded_file(field.data) or field.object_data):
+        raise ValidationError('Please choose an image, or delete this row.')
+
+class ProjectImageInlineForm(InlineFormAdmin):
+    form_columns = ['id', 'sort_order', 'filename']
+    form_label = 'Project Image'
+
+    form_extra_fields = {
+        'filename': VipsImageUploadField(
+            'Image',
+            validators=[_image_required],
+            base_path='static/uploads/projects',
+            url_relative_path='uploads/projects/',
+            allowed_extensions=['jpg', 'jpeg', 'png', 'gif'],
+            max_size=(1200, 800, False),
+            thumbnail_size=(150, 150, True)
+        )
+    }
+
+# Inline rows (and a deleted project's images) are removed by the session rather
+# than the upload field, so delete their files once the removal is committed
+@event.listens_for(ProjectImage, 'after_delete')
+def _queue_project_image_removal(mapper, connection, target):
+    session = object_session(target)
+    session.info.setdefault('removed_project_images', []).append(target.filename)
+
+@event.listens_for(Session, 'after_commit')
+def _remove_project_image_files(session):
+    for filename in session.info.pop('removed_project_images', []):
+        _remove_file(os.path.join('static/uploads/projects', filename))
+        _remove_file(os.path.join('static/uploads/projects', thumbgen_filename(filename)))
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_project_image_removals(session):
+    session.info.pop('removed_project_images', None)
+
 class ProjectModelView(AuthenticatedModelView):
-    column_list = ['title', 'topic', 'status', 'start_date', 'image1', 'image2', 'image3', 'image4']
+    column_list = ['title', 'topic', 'status', 'start_date', 'images']
     column_filters = ['status', 'topic']
     column_searchable_list = ['title', 'overview']
-    form_excluded_columns = ['created_at']
+    form_excluded_columns = ['created_at', 'members']
+
+    # Project images are edited inline, one row per image
+    inline_models = [ProjectImageInlineForm(ProjectImage)]
 
-    # Configure file upload for multiple image fields
     form_overrides = {
-        'image1': ImageUploadField,
-        'image2': ImageUploadField,
-        'image3': ImageUploadField,
-        'image4': ImageUploadField,
         'status': SelectField
     }
 
     form_args = {
-        'image1': {
-            'label': 'Project Image 1',
-            'base_path': 'static/uploads/projects',
-            'url_relative_path': 'uploads/projects/',
-            'allowed_extensions': ['jpg', 'jpeg', 'png', 'gif'],
-            'max_size': (1200, 800, False),
-            'thumbnail_size': (150, 150, True),
-            'validators': [validators.Optional()]
-        },
-        'image2': {
-            'label': 'Project Image 2',
-            'base_path': 'static/uploads/projects',
-            'url_relative_path': 'uploads/projects/',
-            'allowed_extensions': ['jpg', 'jpeg', 'png', 'gif'],
-            'max_size': (1200, 800, False),
-            'thumbnail_size': (150, 150, True),
-            'validators': [validators.Optional()]
-        },
-        'image3': {
-            'label': 'Project Image 3',
-            'base_path': 'static/uploads/projects',
-            'url_relative_path': 'uploads/projects/',
-            'allowed_extensions': ['jpg', 'jpeg', 'png', 'gif'],
-            'max_size': (1200, 800, False),
-            'thumbnail_size': (150, 150, True),
-            'validators': [validators.Optional()]
-        },
-        'image4': {
-            'label': 'Project Image 4',
-            'base_path': 'static/uploads/projects',
-            'url_relative_path': 'uploads/projects/',
-            'allowed_extensions': ['jpg', 'jpeg', 'png', 'gif'],
-            'max_size': (1200, 800, False),
-            'thumbnail_size': (150, 150, True),
-            'validators': [validators.Optional()]
-        },
         'status': {
             'choices': [('Ongoing', 'Ongoing'), ('Completed', 'Completed')],
             'coerce': str
         }
     }
 
-    def _list_thumbnail(view, context, model, name):
-        img = getattr(model, name)
-        if not img:
-            return ''
-        return f'<img src="/uploads/projects/{img}" width="75">'
+    _thumbnail_html = Markup('<img src="/static/uploads/projects/%s" width="75">')
+
+    def _list_thumbnails(view, context, model, name):
+        return Markup(' ').join(view._thumbnail_html % image.filename for image in model.images)
 
     column_formatters = {
-        'image1': _list_thumbnail,
-        'image2': _list_thumbnail,
-        'image3': _list_thumbnail,
-        'image4': _list_thumbnail,
+        'images': _list_thumbnails,
     }
 
+    # The list view shows every image, so load them with the page query
+    def get_query(self):
+        return super().get_query().options(selectinload(Project.images))
+
 from wtforms import TextAreaField
 
 class PublicationModelView(AuthenticatedModelView):
@@ -212,9 +373,10 @@ class PublicationModelView(AuthenticatedModelView):
         }
     }
     
-    # Auto-parse BibTeX on save
+    # Auto-parse BibTeX on save, skipping the parse when the entry is unchanged
     def on_model_change(self, form, model, is_created):
-        model.parse_bibtex()
+        if is_created or inspect(model).attrs.bibtex.history.has_changes():
+            model.parse_bibtex()
         super().on_model_change(form, model, is_created)
 
 class LabInfoModelView(AuthenticatedModelView):
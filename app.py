@@ -3,11 +3,15 @@ from flask import Flask, render_template, request, redirect, url_for, flash
 from flask_admin import Admin
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user
 import os
+import sqlite3
 from flask_migrate import Migrate
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import selectinload, load_only
 
 # Import models
 from models import (
-    db, AdminUser, Professor, Student, Project, 
+    db, cache, AdminUser, Professor, Student, Project, 
     Publication, LabInfo
 )
 
@@ -26,17 +30,29 @@ app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///dadl_lab.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 3600  # Let browsers cache static files and uploads
+# Shared on disk so every gunicorn worker sees the same entries and invalidations
+app.config['CACHE_TYPE'] = 'FileSystemCache'
+app.config['CACHE_DIR'] = os.path.join(app.instance_path, 'cache')
+app.config['CACHE_DEFAULT_TIMEOUT'] = 300
 
-# Create upload directories if they don't exist
-for folder in ['static/uploads/professor', 'static/uploads/students', 'static/uploads/projects']:
-    os.makedirs(folder, exist_ok=True)
-    # Create .gitkeep files to preserve empty directories
-    gitkeep_path = os.path.join(folder, '.gitkeep')
-    if not os.path.exists(gitkeep_path):
-        open(gitkeep_path, 'a').close()
+# Tune SQLite for a read-heavy site: WAL lets readers and the admin writer
+# proceed concurrently
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.execute('PRAGMA mmap_size=268435456')  # 256MB
+    cursor.execute('PRAGMA cache_size=-20000')  # ~20MB
+    cursor.close()
 
 # Initialize database with app
 db.init_app(app)
+cache.init_app(app)
 migrate = Migrate(app, db)
 
 # ============================================================================
@@ -71,20 +87,39 @@ admin.add_view(LabInfoModelView(LabInfo, db.session, name='Lab Information'))
 # 4. Routes
 # ============================================================================
 @app.route('/')
+@cache.cached(timeout=300, key_prefix='home')
 def home():
     """Main website homepage"""
     lab_info = LabInfo.query.first()
     professor = Professor.query.first()
     
-    # Students
-    current_phd = Student.query.filter_by(is_current=True, degree_type='PhD').all()
-    current_masters = Student.query.filter_by(is_current=True, degree_type='Masters').all()
-    former_phd = Student.query.filter_by(is_current=False, degree_type='PhD').all()
-    former_masters = Student.query.filter_by(is_current=False, degree_type='Masters').all()
+    # Students - fetch once and bucket by (is_current, degree_type)
+    students_by_group = {}
+    # Only load the columns single_page.html reads
+    student_columns = load_only(
+        Student.name, Student.degree_type, Student.research_focus, Student.school,
+        Student.start_date, Student.end_date, Student.photo, Student.is_current,
+        Student.thesis_title, Student.current_work, Student.linkedin,
+        Student.website, Student.google_scholar, Student.email
+    )
+    for student in Student.query.options(student_columns).all():
+        students_by_group.setdefault((bool(student.is_current), student.degree_type), []).append(student)
+    current_phd = students_by_group.get((True, 'PhD'), [])
+    current_masters = students_by_group.get((True, 'Masters'), [])
+    former_phd = students_by_group.get((False, 'PhD'), [])
+    former_masters = students_by_group.get((False, 'Masters'), [])
     
-    # Projects
-    ongoing_projects = Project.query.filter_by(status='Ongoing').all()
-    completed_projects = Project.query.filter_by(status='Completed').all()
+    # Projects - fetch once and bucket by status
+    projects_by_status = {}
+    project_columns = load_only(
+        Project.title, Project.topic, Project.overview, Project.status,
+        Project.start_date, Project.end_date
+    )
+    project_options = (project_columns, selectinload(Project.images))
+    for project in Project.query.options(*project_options).all():
+        projects_by_status.setdefault(project.status, []).append(project)
+    ongoing_projects = projects_by_status.get('Ongoing', [])
+    completed_projects = projects_by_status.get('Completed', [])
     
     # Publications
     featured_publications = Publication.query.filter_by(is_featured=True).order_by(Publication.year.desc()).limit(5).all()
@@ -145,18 +180,27 @@ def admin_status():
 
 @app.route('/projects/<int:project_id>')
 def project_detail(project_id):
-    project = Project.query.get_or_404(project_id)
-    additional_images = [img for img in [project.image2, project.image3, project.image4] if img]
-    return render_template('project_detail.html', project=project, additional_images=additional_images)
-
+    project = Project.query.options(selectinload(Project.images)).get_or_404(project_id)
+    return render_template('project_detail.html', project=project)
 
 
 # ============================================================================
-# 5. Context Processor
+# 5. Upload Directories
 # ============================================================================
-@app.context_processor
-def inject_user():
-    return dict(current_user=current_user)
+def init_upload_dirs():
+    """Create upload directories if they don't exist"""
+    for folder in ['static/uploads/professor', 'static/uploads/students', 'static/uploads/projects']:
+        os.makedirs(folder, exist_ok=True)
+        # Create .gitkeep files to preserve empty directories
+        gitkeep_path = os.path.join(folder, '.gitkeep')
+        if not os.path.exists(gitkeep_path):
+            open(gitkeep_path, 'a').close()
+
+@app.cli.command('init-uploads')
+def init_uploads_command():
+    """Create the upload directories"""
+    init_upload_dirs()
+    print("Upload directories ready")
 
 # ============================================================================
 # 6. Database Initialization
@@ -240,6 +284,7 @@ def create_default_data():
 # 7. Main Entry Point
 # ============================================================================
 if __name__ == '__main__':
+    init_upload_dirs()
     with app.app_context():
         # Only create tables, don't delete database
         db.create_all()
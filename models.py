@@ -1,10 +1,20 @@
 # models.py
 from flask_sqlalchemy import SQLAlchemy
+from flask_caching import Cache
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+import functools
 
 db = SQLAlchemy()
+cache = Cache()  # Rendered public pages, cleared whenever the admin saves
+
+
+@functools.cache
+def _get_bibtex_parser():
+    """Import bibtexparser on first use so workers that never parse skip it"""
+    import bibtexparser
+    return bibtexparser
 
 # ============================================================================
 # Authentication Model (Separate from data models!)
@@ -55,7 +65,7 @@ class Student(db.Model):
     """Student information"""
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    degree_type = db.Column(db.String(20), nullable=False)  # 'PhD', 'Masters'
+    degree_type = db.Column(db.String(20), nullable=False, index=True)  # 'PhD', 'Masters'
     research_focus = db.Column(db.Text, nullable=True)
     school = db.Column(db.String(200), nullable=False)
     start_date = db.Column(db.String(20), nullable=True)
@@ -63,7 +73,7 @@ class Student(db.Model):
     photo = db.Column(db.String(200), nullable=True)
     
     # Current vs Previous
-    is_current = db.Column(db.Boolean, default=True)
+    is_current = db.Column(db.Boolean, default=True, index=True)
     
     # For previous students
     thesis_title = db.Column(db.String(500), nullable=True)
@@ -92,23 +102,40 @@ class Project(db.Model):
     title = db.Column(db.String(200), nullable=False)
     topic = db.Column(db.String(200), nullable=True)
     overview = db.Column(db.Text, nullable=False)
-    status = db.Column(db.String(50), default='Ongoing')
+    status = db.Column(db.String(50), default='Ongoing', index=True)
     start_date = db.Column(db.String(20), nullable=True)
     end_date = db.Column(db.String(20), nullable=True)
     
-    image1 = db.Column(db.String(200), nullable=True)
-    image2 = db.Column(db.String(200), nullable=True)
-    image3 = db.Column(db.String(200), nullable=True)
-    image4 = db.Column(db.String(200), nullable=True)
-    
     # Relationships
     members = db.relationship('Student', secondary=project_members, backref='projects')
+    images = db.relationship('ProjectImage', backref='project',
+                             order_by='(ProjectImage.sort_order, ProjectImage.id)',
+                             cascade='all, delete-orphan')
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    @property
+    def cover_image(self):
+        """Filename of the first project image, shown on cards and the detail page"""
+        return self.images[0].filename if self.images else None
+
     def __repr__(self):
         return f'<Project {self.title}>'
 
+class ProjectImage(db.Model):
+    """Image attached to a research project, in display order"""
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False)
+    sort_order = db.Column(db.Integer, nullable=False, default=0)
+    filename = db.Column(db.String(200), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_project_image_project_id_sort_order', 'project_id', 'sort_order'),
+    )
+
+    def __repr__(self):
+        return f'<ProjectImage {self.filename}>'
+
 class Publication(db.Model):
     """Publication information"""
     id = db.Column(db.Integer, primary_key=True)
@@ -118,7 +145,7 @@ class Publication(db.Model):
     title = db.Column(db.String(500), nullable=True)
     authors = db.Column(db.String(500), nullable=True)
     venue = db.Column(db.String(200), nullable=True)
-    year = db.Column(db.Integer, nullable=True)
+    year = db.Column(db.Integer, nullable=True, index=True)
     
     # Additional fields
     url = db.Column(db.String(500), nullable=True)
@@ -128,11 +155,15 @@ class Publication(db.Model):
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Backs the homepage's "featured, newest first, limit 5" query
+    __table_args__ = (
+        db.Index('ix_pub_featured_year', year.desc(), sqlite_where=is_featured == True),
+    )
+
     def parse_bibtex(self):
         """Parse BibTeX and populate fields"""
         try:
-            import bibtexparser
-            bib_db = bibtexparser.loads(self.bibtex)
+            bib_db = _get_bibtex_parser().loads(self.bibtex)
             if bib_db.entries:
                 entry = bib_db.entries[0]
                 self.title = entry.get('title', '').replace('{', '').replace('}', '')